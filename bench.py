@@ -0,0 +1,435 @@
+"""Offline benchmark / load test for the tax bot.
+
+Drives the real slash-command callbacks (tax, pay, markpaid, dashboard, unpaid,
+remind) and the player-name autocomplete against a throwaway SQLite database (or,
+with --database-url, a scratch Postgres schema) holding synthetic rosters, with
+stub Interaction / Member / User objects standing in for Discord. Every call the
+commands would make to Discord goes through FakeRest, which adds configurable
+latency and answers a share of requests with 429:
+
+- interaction responses, followups and channel posts absorb the 429 the way
+  discord.py's HTTP client does (wait retry_after, then succeed);
+- DM sends raise the 429 so the reminder dispatcher's own backoff is exercised.
+
+Usage:
+    python bench.py                                  # 1k, 10k and 100k players
+    python bench.py --sizes 1000 --rest-latency-ms 0 --json out.json
+    python bench.py --compare out.json               # exit 1 on a p99 / ops/s regression
+    python bench.py --database-url postgresql://localhost/taxbot   # PostgresStorage, schema taxbot_bench
+"""
+import os
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+import discord
+
+import main
+
+COMMANDS = ["tax", "dashboard", "unpaid", "pay", "markpaid", "autocomplete", "remind"]
+DEFAULT_OPS = {"tax": 1000, "dashboard": 200, "unpaid": 20, "pay": 1000, "markpaid": 1000, "autocomplete": 1000,
+               "remind": 1}
+ADMIN_ID = 1
+PLAYER_ID_BASE = 10_000_000
+LOG_CHANNEL = 2
+BENCH_SCHEMA = "taxbot_bench"  # dropped and recreated by every --database-url run
+
+# ----------------- Simulated REST layer -----------------
+class _RateLimitedResponse:
+    status = 429
+    reason = "Too Many Requests"
+
+class FakeRest:
+    def __init__(self, latency, jitter, rate_429, retry_after):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.throttled = 0
+
+    async def call(self, raise_429=False):
+        while True:
+            self.calls += 1
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+            if not self.rate_429 or random.random() >= self.rate_429:
+                return
+            self.throttled += 1
+            if raise_429:
+                e = discord.HTTPException(_RateLimitedResponse(), "You are being rate limited.")
+                e.retry_after = self.retry_after
+                raise e
+            await asyncio.sleep(self.retry_after)
+
+# ----------------- Fake Discord objects -----------------
+class FakeUser:
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+
+class FakeMember(FakeUser):
+    def __init__(self, user_id, name):
+        super().__init__(user_id, name)
+        self.guild_permissions = discord.Permissions.none()
+        self.roles = []
+
+class FakeMessage:
+    def __init__(self, rest):
+        self._rest = rest
+
+    async def edit(self, **kwargs):
+        await self._rest.call()
+        return self
+
+class FakeChannel:
+    def __init__(self, channel_id, rest):
+        self.id = channel_id
+        self._rest = rest
+
+    async def send(self, content=None, **kwargs):
+        await self._rest.call()
+        return FakeMessage(self._rest)
+
+class FakeDMChannel:
+    def __init__(self, rest):
+        self._rest = rest
+
+    async def send(self, content=None, **kwargs):
+        await self._rest.call(raise_429=True)
+        return FakeMessage(self._rest)
+
+class FakeGuild:
+    def __init__(self, guild_id, owner_id, rest, log_channel):
+        self.id = guild_id
+        self.owner_id = owner_id
+        self._rest = rest
+        self._channels = {log_channel: FakeChannel(log_channel, rest)} if log_channel else {}
+
+    def get_member(self, user_id):
+        return None
+
+    async def fetch_member(self, user_id):
+        await self._rest.call()
+        return FakeMember(user_id, f"user{user_id}")
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+    async def fetch_channel(self, channel_id):
+        await self._rest.call()
+        return self._channels.get(channel_id)
+
+class FakeResponse:
+    def __init__(self, rest):
+        self._rest = rest
+        self._done = False
+        self.view = None
+
+    def is_done(self):
+        return self._done
+
+    async def _respond(self):
+        if self._done:
+            raise discord.InteractionResponded(None)
+        await self._rest.call()
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond()
+        self.view = kwargs.get("view")
+
+    async def defer(self, **kwargs):
+        await self._respond()
+
+    async def edit_message(self, **kwargs):
+        await self._respond()
+
+class FakeFollowup:
+    def __init__(self, rest):
+        self._rest = rest
+        self.view = None
+
+    async def send(self, content=None, wait=False, **kwargs):
+        await self._rest.call()
+        self.view = kwargs.get("view") or self.view
+        return FakeMessage(self._rest) if wait else None
+
+class FakeInteraction:
+    _ids = iter(range(1, 1 << 62))
+
+    def __init__(self, guild, user, rest):
+        self.id = next(self._ids)
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.response = FakeResponse(rest)
+        self.followup = FakeFollowup(rest)
+        self.extras = {}
+        self.command = None
+        self._rest = rest
+
+    async def original_response(self):
+        await self._rest.call()
+        return FakeMessage(self._rest)
+
+    async def delete_original_response(self):
+        await self._rest.call()
+
+# ----------------- Synthetic rosters -----------------
+def player_id(i):
+    return PLAYER_ID_BASE + i
+
+def player_name(i):
+    return f"player{i:06d}"
+
+async def seed_guild(guild_id, size, paid_fraction, rng):
+    gid = str(guild_id)
+    rows = [(str(player_id(i)), player_name(i), rng.randint(1, 60), rng.randint(0, 12)) for i in range(size)]
+    await main.storage.bulk_upsert_players(gid, rows)
+    paid = [(d, n, 5.0, None) for d, n, _, _ in rows if rng.random() < paid_fraction]
+    if paid:
+        await main.storage.bulk_record_payments(gid, paid, "bench")
+
+async def leave_unpaid(guild_id, keep):
+    # pay everyone but `keep` players so /remind fans out to a fixed number of DMs
+    gid = str(guild_id)
+    unpaid = await main.get_unpaid_today(gid)
+    rows = [(d, n, due, None) for d, n, _, _, due in unpaid[keep:]]
+    if rows:
+        await main.storage.bulk_record_payments(gid, rows, "bench")
+
+# ----------------- Scenarios -----------------
+def make_op(command, guild, admin, rest, size, rng):
+    def member():
+        i = rng.randrange(size)
+        return FakeMember(player_id(i), player_name(i))
+
+    def interaction(user):
+        return FakeInteraction(guild, user, rest)
+
+    def amount():
+        # distinct amounts, so repeat payments aren't dropped as double submits
+        return round(rng.uniform(1, 100), 2)
+
+    if command == "tax":
+        return lambda: main.tax.callback(interaction(member()))
+    if command == "pay":
+        return lambda: main.pay.callback(interaction(member()), amount())
+    if command == "markpaid":
+        return lambda: main.markpaid.callback(interaction(admin), amount(), member())
+    if command == "autocomplete":
+        # an admin typing the first few characters of a registered name
+        return lambda: main.player_autocomplete(interaction(admin), player_name(rng.randrange(size))[:9])
+    if command == "unpaid":
+        return lambda: main.unpaid.callback(interaction(admin))
+    if command == "remind":
+        return lambda: main.remind.callback(interaction(admin), "both")
+    if command == "dashboard":
+        async def open_and_page():
+            # open the dashboard, then click ▶ once
+            inter = interaction(admin)
+            await main.dashboard.callback(inter)
+            view = inter.response.view or inter.followup.view
+            if view is not None and view.next_cursor is not None:
+                await view.next_page.callback(interaction(admin))
+        return open_and_page
+    raise ValueError(command)
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+async def run_ops(n, concurrency, op):
+    latencies = []
+    errors = 0
+    pending = iter(range(n))
+
+    async def worker():
+        nonlocal errors
+        for _ in pending:
+            t = time.perf_counter()
+            try:
+                await op()
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    print(f"  first error: {type(e).__name__}: {e}", file=sys.stderr)
+            latencies.append(time.perf_counter() - t)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, n)))))
+    return latencies, errors, time.perf_counter() - t0
+
+async def bench_size(size, args, rest, ops, rng):
+    guild = FakeGuild(size, ADMIN_ID, rest, LOG_CHANNEL if args.log_channel else None)
+    admin = FakeMember(ADMIN_ID, "bench-admin")
+    results = []
+
+    t = time.perf_counter()
+    await seed_guild(guild.id, size, args.paid_fraction, rng)
+    seeded = time.perf_counter() - t
+    t = time.perf_counter()
+    await main.ensure_roster(str(guild.id))
+    loaded = time.perf_counter() - t
+    print(f"{size} players: seeded in {seeded:.2f}s, roster loaded in {loaded * 1000:.1f} ms")
+
+    for command in args.commands:
+        n = ops[command]
+        if command == "remind":
+            await leave_unpaid(guild.id, args.remind_unpaid)
+        rest.reset()
+        latencies, errors, wall = await run_ops(n, 1 if command == "remind" else args.concurrency,
+                                                make_op(command, guild, admin, rest, size, rng))
+        result = {
+            "size": size,
+            "command": command,
+            "ops": n,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "ops_per_sec": n / wall if wall else 0.0,
+            "errors": errors,
+            "rest_calls": rest.calls,
+            "rest_429": rest.throttled,
+        }
+        if command == "remind":
+            result["dms_per_sec"] = min(args.remind_unpaid, size) * n / wall if wall else 0.0
+        results.append(result)
+        print_row(result)
+    return results
+
+# ----------------- Reporting -----------------
+HEADER = f"{'size':>8} {'command':<12} {'ops':>6} {'p50 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'errors':>6} {'rest':>7} {'429s':>5}"
+
+def print_row(r):
+    extra = f"  ({r['dms_per_sec']:.1f} DMs/s)" if "dms_per_sec" in r else ""
+    print(f"{r['size']:>8} {r['command']:<12} {r['ops']:>6} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+          f"{r['ops_per_sec']:>9.1f} {r['errors']:>6} {r['rest_calls']:>7} {r['rest_429']:>5}{extra}")
+
+def compare(results, baseline_path, tolerance):
+    # a regression is p99 above baseline*(1+tolerance) or throughput below baseline/(1+tolerance)
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["size"], r["command"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        b = baseline.get((r["size"], r["command"]))
+        if b is None:
+            continue
+        if r["p99_ms"] > b["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{r['size']} {r['command']}: p99 {b['p99_ms']:.2f} -> {r['p99_ms']:.2f} ms")
+        if r["ops_per_sec"] < b["ops_per_sec"] / (1 + tolerance):
+            regressions.append(f"{r['size']} {r['command']}: ops/s {b['ops_per_sec']:.1f} -> {r['ops_per_sec']:.1f}")
+    return regressions
+
+def parse_ops(spec):
+    ops = dict(DEFAULT_OPS)
+    for part in filter(None, (spec or "").split(",")):
+        name, _, value = part.partition("=")
+        if name not in ops or not value.isdigit():
+            raise argparse.ArgumentTypeError(f"bad --ops entry: {part!r}")
+        ops[name] = int(value)
+    return ops
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline benchmark for the tax bot's command callbacks.")
+    p.add_argument("--sizes", default="1000,10000,100000", help="roster sizes, comma separated")
+    p.add_argument("--commands", default=",".join(COMMANDS), help="commands to run, in order")
+    p.add_argument("--ops", type=parse_ops, default=parse_ops(""), help="per-command op counts, e.g. tax=5000,unpaid=5")
+    p.add_argument("--concurrency", type=int, default=50, help="concurrent invocations per command")
+    p.add_argument("--rest-latency-ms", type=float, default=40.0, help="base latency of each simulated REST call")
+    p.add_argument("--rest-jitter-ms", type=float, default=20.0, help="uniform extra latency per REST call")
+    p.add_argument("--rate-429", type=float, default=0.01, help="share of REST calls answered with 429")
+    p.add_argument("--retry-after", type=float, default=0.5, help="retry_after carried by simulated 429s")
+    p.add_argument("--paid-fraction", type=float, default=0.5, help="share of the roster already paid today")
+    p.add_argument("--remind-unpaid", type=int, default=200, help="unpaid players left for /remind to DM")
+    p.add_argument("--dm-rate", type=float, default=main.REMIND_RATE_PER_SEC, help="reminder DM pacing (per second)")
+    p.add_argument("--log-channel", action="store_true", help="configure LOG_CHANNEL_ID so commands post there")
+    p.add_argument("--database-url", help=f"benchmark PostgresStorage on this server (schema {BENCH_SCHEMA})")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", dest="json_out", help="write results to this file")
+    p.add_argument("--compare", help="baseline JSON from an earlier --json run; exit 1 on regression")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs --compare baseline")
+    args = p.parse_args(argv)
+    args.sizes = [int(s) for s in args.sizes.split(",") if s]
+    args.commands = [c for c in args.commands.split(",") if c]
+    unknown = set(args.commands) - set(COMMANDS)
+    if unknown:
+        p.error(f"unknown commands: {', '.join(sorted(unknown))}")
+    return args
+
+async def reset_bench_schema(url):
+    import asyncpg
+    conn = await asyncpg.connect(url)
+    try:
+        await conn.execute(f'DROP SCHEMA IF EXISTS "{BENCH_SCHEMA}" CASCADE')
+    finally:
+        await conn.close()
+
+async def run(args):
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    rest = FakeRest(args.rest_latency_ms / 1000, args.rest_jitter_ms / 1000, args.rate_429, args.retry_after)
+
+    async def fake_dm_channel(user_id):
+        return FakeDMChannel(rest)
+
+    main.get_dm_channel = fake_dm_channel
+    main.reminder_dispatcher = main.ReminderDispatcher(rate=args.dm_rate)
+    main.LOG_CHANNEL_ID = LOG_CHANNEL if args.log_channel else None
+    if args.database_url:
+        await reset_bench_schema(args.database_url)
+        main.storage = main.PostgresStorage(args.database_url, schema=BENCH_SCHEMA)
+    await main.storage.init()
+
+    print(f"REST latency {args.rest_latency_ms:g}+{args.rest_jitter_ms:g} ms, 429 rate {args.rate_429:g}, "
+          f"concurrency {args.concurrency}, date {date.today().isoformat()}")
+    print(HEADER)
+    results = []
+    try:
+        for size in args.sizes:
+            results.extend(await bench_size(size, args, rest, args.ops, rng))
+    finally:
+        await main.work_queue.stop()
+        await main.log_publisher.stop()
+        await main.payment_writer.stop()
+        await main.storage.close()
+    return results
+
+def cli(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="taxbot-bench-") as tmp:
+        main.DB_FILE = os.path.join(tmp, "bench.db")
+        try:
+            results = asyncio.run(run(args))
+        finally:
+            main.close_db()
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k not in ("json_out", "compare")},
+                       "results": results}, f, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print("\nRegressions vs baseline:")
+            for line in regressions:
+                print(f"- {line}")
+            return 1
+        print("\nNo regressions vs baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(cli())
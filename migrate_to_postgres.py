@@ -0,0 +1,112 @@
+"""Copy an existing tax_bot.db into PostgreSQL for PostgresStorage.
+
+Brings the SQLite file up to the current schema first (the same migrations the
+bot runs at startup), creates the Postgres schema the way the bot would, then
+streams every table across with COPY in --batch sized chunks, all in one
+transaction: a failed run leaves the target as it was. Ids are kept, and the
+payments / names sequences are moved past them so new rows don't collide.
+
+Stop the bot before running this; payments recorded during the copy would be
+left behind. Archived months (ARCHIVE_DIR) are plain files and stay where they
+are, so run the bot from the same directory afterwards.
+
+Usage:
+    python migrate_to_postgres.py postgresql://user@host/taxbot
+    python migrate_to_postgres.py "$DATABASE_URL" --sqlite old/tax_bot.db --batch 20000
+    python migrate_to_postgres.py "$DATABASE_URL" --replace     # overwrite a non-empty target
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import asyncpg
+
+import main
+
+# copy order; tax_schedule is rebuilt from the code by PostgresStorage.init
+TABLES = ["players", "bot_admins", "names", "payments", "daily_ledger", "job_runs", "meta", "arrears",
+          "archive_members"]
+SERIAL_TABLES = ["names", "payments"]
+# meta keys PostgresStorage owns; the SQLite value would be wrong there
+SKIP_META = {"schema_version"}
+
+def _coercer(pg_type):
+    # SQLite only has affinities, so a column can hold e.g. '12' in an INTEGER column
+    if pg_type in ("integer", "bigint"):
+        return lambda v: None if v is None else int(v)
+    if pg_type == "double precision":
+        return lambda v: None if v is None else float(v)
+    return lambda v: None if v is None else str(v)
+
+async def pg_columns(conn, schema, table):
+    # -> [(column, data_type)] in table order
+    rows = await conn.fetch('SELECT column_name, data_type FROM information_schema.columns '
+                            'WHERE table_schema=$1 AND table_name=$2 ORDER BY ordinal_position', schema, table)
+    return [(r[0], r[1]) for r in rows]
+
+async def copy_table(src, conn, schema, table, batch):
+    have = {r[1] for r in src.execute(f'PRAGMA table_info({table})')}
+    cols = [(c, t) for c, t in await pg_columns(conn, schema, table) if c in have]
+    names = [c for c, _ in cols]
+    coerce = [_coercer(t) for _, t in cols]
+    sql = f'SELECT {",".join(names)} FROM {table}'
+    if table == "meta":
+        sql += f' WHERE key NOT IN ({",".join("?" * len(SKIP_META))})'
+    cur = src.execute(sql, tuple(SKIP_META) if table == "meta" else ())
+    n = 0
+    while rows := cur.fetchmany(batch):
+        records = [tuple(f(v) for f, v in zip(coerce, row)) for row in rows]
+        await conn.copy_records_to_table(table, records=records, columns=names, schema_name=schema)
+        n += len(records)
+    return n
+
+async def migrate(args):
+    # the SQLite side: same migrations as the bot's startup
+    main.DB_FILE = args.sqlite
+    main.init_db()
+    src = main.get_conn()
+    target = main.PostgresStorage(args.dsn, args.schema)
+    await target.init()
+    await target.close()
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        async with conn.transaction():
+            nonempty = [t for t in ("players", "payments") if await conn.fetchval(
+                f'SELECT EXISTS (SELECT 1 FROM "{args.schema}".{t})')]
+            if nonempty and not args.replace:
+                raise SystemExit(f"target already has {' and '.join(nonempty)}; pass --replace to overwrite it")
+            await conn.execute('TRUNCATE ' + ", ".join(f'"{args.schema}".{t}' for t in TABLES) +
+                               ' RESTART IDENTITY')
+            # put back the schema version TRUNCATE took with meta
+            await conn.execute(f'INSERT INTO "{args.schema}".meta(key,value) VALUES($1,$2)',
+                               "schema_version", str(len(main.PG_MIGRATIONS)))
+            for table in TABLES:
+                t = time.perf_counter()
+                n = await copy_table(src, conn, args.schema, table, args.batch)
+                print(f"{table:<14}{n:>10} rows  {time.perf_counter() - t:7.2f}s")
+            for table in SERIAL_TABLES:
+                await conn.execute(f"SELECT setval(pg_get_serial_sequence('\"{args.schema}\".{table}', 'id'), "
+                                   f'COALESCE(MAX(id), 0) + 1, false) FROM "{args.schema}".{table}')
+    finally:
+        await conn.close()
+        main._close_conn()
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Copy tax_bot.db into a PostgreSQL database.")
+    p.add_argument("dsn", help="postgresql:// URL, the same value the bot gets as DATABASE_URL")
+    p.add_argument("--sqlite", default=main.DB_FILE, help="SQLite database to copy from")
+    p.add_argument("--schema", default=main.PG_SCHEMA, help="target schema (PG_SCHEMA)")
+    p.add_argument("--batch", type=int, default=10000, help="rows per COPY")
+    p.add_argument("--replace", action="store_true", help="empty the target tables before copying")
+    return p.parse_args(argv)
+
+def cli(argv=None):
+    args = parse_args(argv)
+    asyncio.run(migrate(args))
+    print("done")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(cli())
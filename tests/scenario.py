@@ -0,0 +1,114 @@
+"""Shared storage scenario and fixtures for the storage tests.
+
+scenario() drives a Storage backend through registrations, payments, the daily
+ledger, arrears and legacy-row adoption, and returns what it read back.
+test_sqlite_storage checks that against known values and test_postgres_storage
+checks PostgresStorage gives the same.
+"""
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+import main
+
+GUILD = "5"
+ADMIN = "adm"
+
+
+def rounded(value):
+    # REAL vs DOUBLE PRECISION sums can differ in the last bits
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, (list, tuple)):
+        return type(value)(rounded(v) for v in value)
+    if isinstance(value, dict):
+        return {k: rounded(v) for k, v in value.items()}
+    return value
+
+
+def reset_caches():
+    # module-level state both backends fill; each run starts from nothing
+    main._rosters.clear()
+    main._snapshots.clear()
+    main._name_ids.clear()
+    main._bot_admins = None
+    main._arrears_rolled = None
+    main._ledger_opened = None
+
+
+async def scenario(st, execute):
+    # execute(sql, *args): a raw write on the backend, for what no command does
+    # (backdating arrears, planting pre-guild rows)
+    today = date.today().isoformat()
+    out = {}
+    await st.bulk_upsert_players(GUILD, [("111", "Alice", 3, 1), ("222", "Bob", 12, 4), ("333", "Cy", 4, 0)])
+    await st.upsert_player(GUILD, "444", "Di", 6, 3)
+
+    # payments: a batch with one bad row, then a bulk batch
+    errors = await st.record_payments([(GUILD, "111", "Alice", 5.0, "", ADMIN),
+                                       (GUILD, "nobody", "x", 1.0, "", ADMIN),
+                                       (GUILD, "222", "Bob", 2.5, "https://proof", ADMIN)])
+    out["record_errors"] = [None if e is None else type(e).__name__ for e in errors]
+    await st.bulk_record_payments(GUILD, [("333", "Cy", 1.5, ""), ("111", "Alice", 1.0, "")], ADMIN)
+    try:
+        await st.bulk_record_payments(GUILD, [("999", "Zed", 1.0, "")], ADMIN)
+    except LookupError:
+        out["bulk_unknown"] = "LookupError"
+    # (payer, amount, proof, admin); ids and timestamps come from the backend
+    out["history"] = [row[1:5] for row in await st.get_payment_history_page(GUILD, "111")]
+
+    # ledger: live totals, then the same after a rebuild from payments
+    out["ledger"] = await st.get_ledger_totals(today, today, GUILD)
+    out["rebuild_rows"] = await st.rebuild_daily_ledger()
+    out["ledger_rebuilt"] = await st.get_ledger_totals(today, today, GUILD)
+
+    # arrears: three unpaid days, then a level change that counts from yesterday
+    out["increment"] = await st.increment_player_field(GUILD, "222", "factories", -10, 0)
+    await st.update_player_field(GUILD, "444", "level", 20, date.today() - timedelta(days=1))
+    await execute("UPDATE arrears SET accrued_through=?", (date.today() - timedelta(days=4)).isoformat())
+    reset_caches()
+    st._arrears_rolled = None
+    out["debtors"] = await st.get_top_debtors(GUILD)
+    out["arrears"] = await st.get_arrears_map(GUILD)
+    out["ledger_after_reprice"] = await st.get_ledger_totals(today, today, GUILD)
+
+    # rows from before guilds: "111" already exists in the guild and stays behind
+    await execute("INSERT INTO players(guild_id,discord_id,name,level,factories,last_paid_date,last_paid_amount) "
+                  "VALUES('',?,?,1,0,NULL,0.0)", "111", "Old")
+    await execute("INSERT INTO players(guild_id,discord_id,name,level,factories,last_paid_date,last_paid_amount) "
+                  "VALUES('',?,?,1,0,NULL,0.0)", "555", "New")
+    out["adopted"] = await st.adopt_legacy_rows(GUILD)
+    out["adopted_again"] = await st.adopt_legacy_rows(GUILD)
+    out["players"] = sorted(rec.as_row() for rec in (await st.load_roster(GUILD)).players.values())
+    out["legacy_left"] = sorted(rec.as_row() for rec in (await st.load_roster("")).players.values())
+    return rounded(out)
+
+
+def _sqlite_write(sql, args):
+    with main.write_transaction() as c:
+        c.execute(sql, args)
+
+
+async def sqlite_execute(sql, *args):
+    await main.run_db(_sqlite_write, sql, args)
+
+
+class SQLiteTestCase(unittest.IsolatedAsyncioTestCase):
+    # a fresh tax_bot.db (and archive folder) in a temp dir, served by SQLiteStorage
+    async def asyncSetUp(self):
+        self.saved = (main.storage, main.DB_FILE, os.getcwd())
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        main.DB_FILE = os.path.join(self.tmp.name, "tax_bot.db")
+        reset_caches()
+        main.storage = self.storage = main.SQLiteStorage()
+        await self.storage.init()
+
+    async def asyncTearDown(self):
+        await main.payment_writer.stop()
+        main.storage, main.DB_FILE, cwd = self.saved
+        await main.run_db(main._close_conn)
+        reset_caches()
+        os.chdir(cwd)
+        self.tmp.cleanup()
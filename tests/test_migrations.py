@@ -0,0 +1,118 @@
+"""init_db from the original (pre-migration) schema, and from an empty file."""
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date, datetime, timezone
+
+import main
+from tests.scenario import reset_caches
+
+# the tables as the first release of the bot created them
+BASELINE_SCHEMA = '''
+    CREATE TABLE players (
+        discord_id TEXT PRIMARY KEY,
+        name TEXT,
+        level INTEGER,
+        factories INTEGER,
+        last_paid_date TEXT,
+        last_paid_amount REAL
+    );
+    CREATE TABLE payments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        discord_id TEXT,
+        payer_name TEXT,
+        amount REAL,
+        proof TEXT,
+        admin_name TEXT,
+        timestamp TEXT
+    );
+    CREATE TABLE bot_admins (
+        discord_id TEXT PRIMARY KEY
+    );
+'''
+
+
+def schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(conn.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+    finally:
+        conn.close()
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (main.DB_FILE, main.LEGACY_GUILD_ID)
+        self.tmp = tempfile.TemporaryDirectory()
+        main.LEGACY_GUILD_ID = ""
+        reset_caches()
+
+    def tearDown(self):
+        main._close_conn()
+        main.DB_FILE, main.LEGACY_GUILD_ID = self.saved
+        reset_caches()
+        self.tmp.cleanup()
+
+    def init(self, name):
+        main._close_conn()
+        main.DB_FILE = os.path.join(self.tmp.name, name)
+        main.init_db()
+        return main.get_conn()
+
+    def test_from_baseline(self):
+        path = os.path.join(self.tmp.name, "old.db")
+        today = date.today().isoformat()
+        old = sqlite3.connect(path)
+        old.executescript(BASELINE_SCHEMA)
+        old.executemany('INSERT INTO players VALUES(?,?,?,?,?,?)',
+                        [("111", "Alice", 3, 1, today, 5.0), ("222", "Bob", 12, 4, None, 0.0)])
+        old.executemany('INSERT INTO payments(discord_id,payer_name,amount,proof,admin_name,timestamp) '
+                        'VALUES(?,?,?,?,?,?)',
+                        [("111", "Alice", 2.0, None, "adm", "2026-01-02T10:00:00.123456"),
+                         ("111", "Alice", 5.0, "https://proof", "adm", "2026-01-03T11:30:00.000001"),
+                         ("222", "Bob", 1.5, "", "boss", "2026-01-04T09:15:00"),
+                         # the old code stamped payments with utcnow().isoformat()
+                         ("111", "Alice", 5.0, None, "adm",
+                          datetime.now(timezone.utc).replace(tzinfo=None).isoformat())])
+        old.execute("INSERT INTO bot_admins VALUES('999')")
+        old.commit()
+        old.close()
+
+        conn = self.init("old.db")
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], len(main.MIGRATIONS))
+        # every old row lands under LEGACY_GUILD_ID
+        self.assertEqual(conn.execute("SELECT guild_id, discord_id, name, level, factories, last_paid_date, "
+                                      "last_paid_amount FROM players ORDER BY discord_id").fetchall(),
+                         [("", "111", "Alice", 3, 1, today, 5.0), ("", "222", "Bob", 12, 4, None, 0.0)])
+        self.assertEqual(conn.execute("SELECT guild_id, discord_id FROM bot_admins").fetchall(), [("", "999")])
+        # payments are compacted (epoch ts, interned names) and read back the same through payment_log
+        self.assertNotIn("timestamp", main._columns(conn.cursor(), "payments"))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM names").fetchone()[0], 4)
+        self.assertEqual(conn.execute("SELECT id, guild_id, discord_id, payer_name, amount, proof, admin_name, "
+                                      "timestamp FROM payment_log ORDER BY id LIMIT 3").fetchall(),
+                         [(1, "", "111", "Alice", 2.0, "", "adm", "2026-01-02T10:00:00"),
+                          (2, "", "111", "Alice", 5.0, "https://proof", "adm", "2026-01-03T11:30:00"),
+                          (3, "", "222", "Bob", 1.5, "", "boss", "2026-01-04T09:15:00")])
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM payments").fetchone()[0], 4)
+        # arrears start today; Alice's payment today is credited
+        self.assertEqual(conn.execute("SELECT discord_id, balance FROM arrears ORDER BY 1").fetchall(),
+                         [("111", -5.0), ("222", 0.0)])
+        # the same tables, views and indexes as a database created from scratch
+        fresh = os.path.join(self.tmp.name, "new.db")
+        self.init("new.db")
+        self.assertEqual(schema(path), schema(fresh))
+        self.assertNotIn(("index", "idx_players_guild_name"), schema(path))
+        self.assertIn(("index", "idx_payments_guild_member_ts"), schema(path))
+
+    def test_rerun_is_a_no_op(self):
+        conn = self.init("tax_bot.db")
+        before = schema(main.DB_FILE)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        conn = self.init("tax_bot.db")
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], version)
+        self.assertEqual(schema(main.DB_FILE), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""PostgresStorage against SQLiteStorage: the same writes must read back the same.
+
+Needs a PostgreSQL server and asyncpg (requirements-postgres.txt); skipped unless
+TAXBOT_TEST_DATABASE_URL is set. The test works in its own schema, which it drops
+before and after the run, so any scratch database will do:
+
+    TAXBOT_TEST_DATABASE_URL=postgresql://localhost/postgres python -m unittest tests.test_postgres_storage
+"""
+import os
+import unittest
+
+import main
+from tests.scenario import SQLiteTestCase, reset_caches, scenario, sqlite_execute
+
+DSN = os.environ.get("TAXBOT_TEST_DATABASE_URL")
+SCHEMA = "taxbot_test"
+
+
+@unittest.skipUnless(DSN, "set TAXBOT_TEST_DATABASE_URL to run against PostgreSQL")
+class PostgresMatchesSQLite(SQLiteTestCase):
+    async def asyncSetUp(self):
+        import asyncpg
+        self.asyncpg = asyncpg
+        await super().asyncSetUp()
+        await self.drop_schema()
+
+    async def asyncTearDown(self):
+        await super().asyncTearDown()
+        await self.drop_schema()
+
+    async def drop_schema(self):
+        conn = await self.asyncpg.connect(DSN)
+        try:
+            await conn.execute(f'DROP SCHEMA IF EXISTS "{SCHEMA}" CASCADE')
+        finally:
+            await conn.close()
+
+    async def run_postgres(self):
+        main.storage = st = main.PostgresStorage(DSN, SCHEMA)
+        await st.init()
+
+        async def execute(sql, *args):
+            await st._pool.execute(main._pg_sql(sql), *args)
+
+        try:
+            return await scenario(st, execute)
+        finally:
+            await st.close()
+
+    async def test_same_results(self):
+        expected = await scenario(self.storage, sqlite_execute)
+        reset_caches()
+        got = await self.run_postgres()
+        self.assertEqual(expected["record_errors"], [None, "LookupError", None])
+        self.assertEqual(expected["adopted"], 1)
+        for key in expected:
+            with self.subTest(key):
+                self.assertEqual(got.get(key), expected[key])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""SQLiteStorage end to end: the shared scenario, the payment writer, the archive."""
+import asyncio
+import os
+import time
+import unittest
+from datetime import date, timedelta
+
+import main
+from tests.scenario import ADMIN, GUILD, SQLiteTestCase, scenario, sqlite_execute
+
+
+class ScenarioTest(SQLiteTestCase):
+    async def test_scenario(self):
+        today = date.today().isoformat()
+        out = await scenario(self.storage, sqlite_execute)
+        self.assertEqual(out["record_errors"], [None, "LookupError", None])
+        self.assertEqual(out["bulk_unknown"], "LookupError")
+        self.assertEqual(out["history"], [("Alice", 1.0, "", ADMIN), ("Alice", 5.0, "", ADMIN)])
+        # (collected, payers, payments, expected)
+        self.assertEqual(out["ledger"], (10.0, 3, 4, 7.5))
+        self.assertEqual(out["rebuild_rows"], 1)
+        self.assertEqual(out["ledger_rebuilt"], out["ledger"])
+        self.assertEqual(out["increment"], (4, 0))
+        # three days at the old rate, Di's from yesterday at the new one, minus today's payments
+        self.assertEqual(out["debtors"], [("444", "Di", 25.5, 7.0), ("222", "Bob", 6.5, 3.0)])
+        self.assertEqual(out["arrears"], {"444": 25.5, "222": 6.5})
+        self.assertEqual(out["ledger_after_reprice"], (10.0, 3, 4, 10.0))
+        self.assertEqual((out["adopted"], out["adopted_again"]), (1, 0))
+        self.assertEqual(out["players"], [("111", "Alice", 3, 1, today, 1.0), ("222", "Bob", 12, 0, today, 2.5),
+                                          ("333", "Cy", 4, 0, today, 1.5), ("444", "Di", 20, 3, None, 0.0),
+                                          ("555", "New", 1, 0, None, 0.0)])
+        self.assertEqual(out["legacy_left"], [("111", "Old", 1, 0, None, 0.0)])
+
+
+class PaymentWriterTest(SQLiteTestCase):
+    async def test_one_batch_and_a_bad_row_fails_alone(self):
+        await self.storage.bulk_upsert_players(GUILD, [("111", "Alice", 3, 1), ("222", "Bob", 12, 4),
+                                                       ("333", "Cy", 4, 0)])
+        batches = []
+        record = self.storage.record_payments
+
+        async def spy(batch):
+            batches.append(len(batch))
+            return await record(batch)
+
+        self.storage.record_payments = spy
+        results = await asyncio.gather(*(main.payment_writer.submit(GUILD, d, "payer", 2.0, None, ADMIN)
+                                         for d in ("111", "999", "222", "333")), return_exceptions=True)
+        self.assertEqual(batches, [4])
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], LookupError)
+        self.assertEqual(results[2:], [None, None])
+        today = date.today().isoformat()
+        self.assertEqual(await self.storage.get_ledger_totals(today, today, GUILD), (6.0, 3, 3, 5.0))
+        self.assertEqual(len(await self.storage.get_payment_history_page(GUILD, "222")), 1)
+
+
+class RecentKeysTest(unittest.TestCase):
+    def test_claim_release_expire(self):
+        keys = main.RecentKeys(0.05)
+        self.assertTrue(keys.claim("a", "b"))
+        self.assertFalse(keys.claim("b", "c"))  # any key seen blocks the claim...
+        self.assertTrue(keys.claim("c"))  # ...without recording the others
+        keys.release("a", "b")
+        self.assertTrue(keys.claim("a"))
+        time.sleep(0.06)
+        self.assertTrue(keys.claim("c"))
+
+
+class ArchiveTest(SQLiteTestCase):
+    async def test_archive_history_and_ledger_horizon(self):
+        today = date.today().isoformat()
+        yesterday = (date.today() - timedelta(days=1)).isoformat()
+        await self.storage.bulk_upsert_players(GUILD, [("111", "Alice", 3, 1), ("222", "Bob", 12, 4)])
+        await self.storage.record_payments([(GUILD, "111", "Alice", 5.0, "", ADMIN),
+                                            (GUILD, "222", "Bob", 2.5, "https://proof", ADMIN)])
+        await sqlite_execute("UPDATE payments SET ts=ts-?", 86400 * 400)
+        await self.storage.record_payments([(GUILD, "111", "Alice", 1.0, "", ADMIN)])
+        old_day = (await self.storage.get_payment_history_page(GUILD, "111"))[-1][5][:10]
+        # the old day gets its ledger row from the payments, today keeps only today's
+        await self.storage.rebuild_daily_ledger()
+        self.assertEqual((await self.storage.get_ledger_totals("", yesterday, GUILD))[0], 7.5)
+        self.assertEqual((await self.storage.get_ledger_totals(today, today, GUILD))[0], 1.0)
+
+        self.assertEqual(await main.archive_payments(), 2)
+        self.assertEqual(await main.archive_payments(), 0)
+        months = await self.storage.get_member_archive_months(GUILD, "111")
+        self.assertEqual(months, [old_day[:7]])
+        self.assertTrue(os.path.exists(main.archive_path(GUILD, months[0])))
+        self.assertEqual(await self.storage.get_member_archive_months(GUILD, "nobody"), [])
+
+        # history reads on past the table into the archived month, newest first
+        self.assertEqual(len(await self.storage.get_payment_history_page(GUILD, "111")), 1)
+        text, cursor = await main.history_page(GUILD, "111", "Alice", 10, None)
+        self.assertEqual(text.splitlines()[1:], [f"- {today} — $1.0 — recorded by {ADMIN}",
+                                                 f"- {old_day} — $5.0 — recorded by {ADMIN}"])
+        self.assertIsNone(cursor)
+
+        # archived days are behind the horizon, so a rebuild keeps their totals
+        await self.storage.rebuild_daily_ledger()
+        self.assertEqual((await self.storage.get_ledger_totals("", yesterday, GUILD))[0], 7.5)
+        self.assertEqual((await self.storage.get_ledger_totals(today, today, GUILD))[0], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()